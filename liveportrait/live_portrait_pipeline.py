@@ -51,15 +51,18 @@ class LivePortraitPipeline(object):
             return source_np[mirror_idx]
 
     def execute(
-        self, source_np, driving_images, crop_info, mismatch_method="constant", reference_frame=0
+        self, source_np, driving_images, crop_info, mismatch_method="constant", reference_frame=0, out_full=None, out_mask=None
     ):
+        """
+        out_full: optional NxHxWx3 uint8 buffer the composited frames are written into
+        out_mask: optional NxHxW float32 buffer the pasted back masks are written into
+        return: the NxHxWx3 cropped frames on the device, out_full and out_mask
+        """
         inference_cfg = self.live_portrait_wrapper.cfg
         device = inference_cfg.device_id
 
-        cropped_image_list = []
-        composited_image_list = []
+        cropped_out = None
         driving_landmark_list = []
-        out_mask_list = []
         R_d_0, x_d_0_info = None, None
 
         if mismatch_method == "cut" or inference_cfg.flag_eye_retargeting or inference_cfg.flag_lip_retargeting:
@@ -67,6 +70,12 @@ class LivePortraitPipeline(object):
         else:
             total_frames = driving_images.shape[0]
 
+        height, width = source_np.shape[1:3]
+        if out_full is None:
+            out_full = np.empty((total_frames, height, width, 3), dtype=np.uint8)
+        if out_mask is None:
+            out_mask = np.empty((total_frames, height, width), dtype=np.float32)
+
         pbar = comfy.utils.ProgressBar(total_frames)
 
         if inference_cfg.flag_eye_retargeting or inference_cfg.flag_lip_retargeting:
@@ -76,7 +85,7 @@ class LivePortraitPipeline(object):
                 raise ValueError("Missing driving_landmark_list in crop_info, get it from opt_driving_images in the Cropper node")
 
         for i in tqdm(range(total_frames), desc='Animating...', total=total_frames):
-            x_d_info = self.live_portrait_wrapper.get_kp_info(driving_images[i].unsqueeze(0).to(device))
+            x_d_info = self.live_portrait_wrapper.get_kp_info(driving_images[i].unsqueeze(0).to(device, non_blocking=True))
 
             safe_index = min(i, len(crop_info["crop_info_list"]) - 1)
             source_lmk = crop_info["crop_info_list"][safe_index]["lmk_crop"]
@@ -235,8 +244,11 @@ class LivePortraitPipeline(object):
 
             out = self.live_portrait_wrapper.warp_decode(f_s, x_s, x_d_i_new)
     
-            cropped_image = torch.clamp(out["out"], 0, 1).permute(0, 2, 3, 1) 
-            cropped_image_list.append(cropped_image)
+            if cropped_out is None:
+                # NxHxWx3 on the output device, each frame is clamped straight into its slot
+                _, c, h, w = out["out"].shape
+                cropped_out = torch.empty((total_frames, h, w, c), dtype=out["out"].dtype, device=out["out"].device)
+            torch.clamp(out["out"][0].permute(1, 2, 0), 0, 1, out=cropped_out[i])
         #return cropped_image_list
             # Transform and blend
             if inference_cfg.flag_pasteback:
@@ -254,12 +266,14 @@ class LivePortraitPipeline(object):
                     )
                 
                 mask_ori = mask_ori.astype(np.float32) / 255.0
+                if mask_ori.ndim == 2:
+                    mask_ori = mask_ori[..., None]  # HxW -> HxWx1, broadcasts against the RGB frames
                 cropped_image_to_original_blend = np.clip(
                     mask_ori * cropped_image_to_original + (1 - mask_ori) * source_frame_rgb, 0, 255
                     ).astype(np.uint8)
 
-            composited_image_list.append(cropped_image_to_original_blend)
-            out_mask_list.append(mask_ori)
+            out_full[i] = cropped_image_to_original_blend
+            out_mask[i] = mask_ori[..., 0]
             pbar.update(1)
 
-        return cropped_image_list, composited_image_list, out_mask_list
+        return cropped_out, out_full, out_mask
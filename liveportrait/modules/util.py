@@ -9,6 +9,7 @@ from torch import nn
 import torch.nn.functional as F
 import torch
 import torch.nn.utils.spectral_norm as spectral_norm
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 import math
 import warnings
 
@@ -325,6 +326,21 @@ def filter_state_dict(state_dict, remove_name='fc'):
     return new_state_dict
 
 
+def fuse_conv_bn(model, pairs=(('conv', 'norm'), ('compress', 'norm'))):
+    """
+    Fold BatchNorm layers into the preceding convolution for inference, the model must be in eval mode.
+    pairs: (conv, norm) attribute names of blocks whose forward applies norm directly after conv
+    """
+    for module in list(model.modules()):
+        for conv_name, norm_name in pairs:
+            conv = getattr(module, conv_name, None)
+            norm = getattr(module, norm_name, None)
+            if isinstance(conv, (nn.Conv2d, nn.Conv3d)) and isinstance(norm, (nn.BatchNorm2d, nn.BatchNorm3d)):
+                setattr(module, conv_name, fuse_conv_bn_eval(conv, norm))
+                setattr(module, norm_name, nn.Identity())
+    return model
+
+
 class GRN(nn.Module):
     """ GRN (Global Response Normalization) layer
     """
@@ -4,6 +4,7 @@ import numpy as np
 from typing import List, Union, Tuple
 from dataclasses import dataclass, field
 import cv2#; cv2.setNumThreads(0); cv2.ocl.setUseOpenCL(False)
+from concurrent.futures import ThreadPoolExecutor
 
 from .landmark_runner import LandmarkRunner
 from .face_analysis_diy import FaceAnalysisDIY
@@ -27,6 +28,8 @@ class Cropper(object):
     def __init__(self, **kwargs) -> None:
         device_id = kwargs.get('device_id', 0)
         provider = kwargs.get('onnx_device', 'CPU')
+        # number of frames detected and cropped concurrently, ONNX Runtime and OpenCV both release the GIL
+        self.num_workers = kwargs.get('num_workers', 1)
         self.landmark_runner = LandmarkRunner(
             ckpt_path=os.path.join(folder_paths.models_dir, 'liveportrait', 'landmark.onnx'),
             onnx_provider=provider,
@@ -43,6 +46,9 @@ class Cropper(object):
         self.face_analysis_wrapper.warmup()
 
     def crop_single_image(self, img_rgb, dsize, scale, vy_ratio, vx_ratio, face_index, rotate):
+        return self.crop_batch([img_rgb], dsize, scale, vy_ratio, vx_ratio, face_index, rotate)[0]
+
+    def _detect_and_crop(self, img_rgb, dsize, scale, vy_ratio, vx_ratio, face_index, rotate):
         direction = 'large-small'
 
         src_face = self.face_analysis_wrapper.get(
@@ -58,7 +64,7 @@ class Cropper(object):
 
         src_face = src_face[face_index] # choose the index if multiple faces detected
         pts = src_face.landmark_2d_106
-       
+
         # crop the face
         ret_dct = crop_image(
             img_rgb,  # ndarray
@@ -75,9 +81,27 @@ class Cropper(object):
 
         input_image_size = img_rgb.shape[:2]
         ret_dct['input_image_size'] = input_image_size
-    
-        recon_ret = self.landmark_runner.run(img_rgb, pts)
-        lmk = recon_ret['pts']
-        ret_dct['lmk_crop'] = lmk
 
-        return ret_dct
\ No newline at end of file
+        return ret_dct, pts
+
+    def crop_batch(self, imgs_rgb, dsize, scale, vy_ratio, vx_ratio, face_index, rotate):
+        """ crop N images, the landmark model runs once for the whole batch
+        imgs_rgb: NxHxWx3 ndarray or list of HxWx3 images
+        """
+        def detect_and_crop(img_rgb):
+            return self._detect_and_crop(img_rgb, dsize, scale, vy_ratio, vx_ratio, face_index, rotate)
+
+        if self.num_workers > 1 and len(imgs_rgb) > 1:
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                results = list(executor.map(detect_and_crop, imgs_rgb))
+        else:
+            results = [detect_and_crop(img_rgb) for img_rgb in imgs_rgb]
+
+        ret_dct_lst = [ret_dct for ret_dct, _ in results]
+        pts_lst = [pts for _, pts in results]
+
+        recon_ret_lst = self.landmark_runner.run_batch(imgs_rgb, pts_lst)
+        for ret_dct, recon_ret in zip(ret_dct_lst, recon_ret_lst):
+            ret_dct['lmk_crop'] = recon_ret['pts']
+
+        return ret_dct_lst
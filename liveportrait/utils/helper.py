@@ -6,6 +6,7 @@ utility functions and classes to handle feature extraction and model loading
 
 import os.path as osp
 import cv2
+import numpy as np
 import torch
 from collections import OrderedDict
 
@@ -71,3 +72,40 @@ def resize_to_limit(img, max_dim=1280, n=2):
     if new_h != img.shape[0] or new_w != img.shape[1]:
         img = img[:new_h, :new_w]
     return img
+
+
+# pixel offsets of the 8 pixel outline cv2.circle draws for radius=2 (LINE_8, thickness=1): (0, ±2), (±2, 0) and (±1, ±1)
+_dy, _dx = np.mgrid[-2:3, -2:3]
+_ring = np.isin(_dy * _dy + _dx * _dx, (2, 4))
+KEYPOINT_RING_OFFSETS = np.stack([_dy[_ring], _dx[_ring]], axis=-1)
+
+
+def draw_keypoints(keypoints_list, height, width, color=(255, 0, 0)):
+    """Draw each Kx2 keypoint array as radius 2 circles into an NxHxWx3 uint8 RGB stack, pixel for pixel like cv2.circle."""
+    images = np.zeros((len(keypoints_list), height, width, 3), dtype=np.uint8)
+    if len(keypoints_list) == 0:
+        return images
+
+    frame_idx = np.concatenate([np.full(len(keypoints), i) for i, keypoints in enumerate(keypoints_list)])
+    points = np.concatenate(keypoints_list, axis=0)
+    # Only keypoints within the image are drawn
+    inside = (points[:, 0] >= 0) & (points[:, 0] < width) & (points[:, 1] >= 0) & (points[:, 1] < height)
+    frame_idx = frame_idx[inside]
+    points = points[inside].astype(np.int64)
+
+    for oy, ox in KEYPOINT_RING_OFFSETS:
+        ys = points[:, 1] + oy
+        xs = points[:, 0] + ox
+        valid = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+        images[frame_idx[valid], ys[valid], xs[valid]] = color
+    return images
+
+
+def make_compile_warmup_inputs(device, driving_dtype, size=256):
+    """Build zero 1x3xsizexsize source and driving frames with the strides and dtypes of the real pipeline inputs.
+    torch.compile guards on strides, including the size 1 batch dim, so the warm-up must match them to avoid recompiling on the first frame:
+    the source is float32 permuted from NHWC like prepare_source, the driving frame is one frame of a channels_last batch unsqueezed like in execute.
+    """
+    source = torch.zeros(1, size, size, 3, device=device).permute(0, 3, 1, 2)
+    driving = torch.zeros(1, size, size, 3, device=device, dtype=driving_dtype).permute(0, 3, 1, 2)[0].unsqueeze(0)
+    return source, driving
@@ -24,12 +24,19 @@ class LandmarkRunner(object):
         self.dsize = kwargs.get('dsize', 224)
         self.timer = Timer()
 
-        if onnx_provider.lower() == 'cuda':
+        self.io_binding = None
+        if onnx_provider.lower() in ('cuda', 'rocm'):
+            gpu_provider = onnx_provider.upper() + 'ExecutionProvider'
             self.session = onnxruntime.InferenceSession(
                 ckpt_path, providers=[
-                    ('CUDAExecutionProvider', {'device_id': device_id})
+                    (gpu_provider, {'device_id': device_id})
                 ]
             )
+            # a CPU-only onnxruntime silently falls back to the CPU provider, there is no device to bind outputs to then
+            if self.session.get_providers()[0] == gpu_provider:
+                # only the landmark output is copied back to the host, the other outputs stay on the device
+                self.io_binding = self.session.io_binding()
+                self.device_id = device_id
         else:
             opts = onnxruntime.SessionOptions()
             opts.intra_op_num_threads = 4
@@ -38,11 +45,24 @@ class LandmarkRunner(object):
                 sess_options=opts
             )
 
+        # a symbolic (non-int) batch dimension means the graph accepts any batch size
+        self.dynamic_batch = not isinstance(self.session.get_inputs()[0].shape[0], int)
+
     def _run(self, inp):
-        out = self.session.run(None, {'input': inp})
-        return out
+        """ return the landmark output (the third model output) for the Nx3xHxW input """
+        if self.io_binding is None:
+            return self.session.run(None, {'input': inp})[2]
 
-    def run(self, img_rgb: np.ndarray, lmk=None):
+        self.io_binding.bind_cpu_input('input', inp)
+        for i, output in enumerate(self.session.get_outputs()):
+            if i == 2:
+                self.io_binding.bind_output(output.name)
+            else:
+                self.io_binding.bind_output(output.name, 'cuda', self.device_id)
+        self.session.run_with_iobinding(self.io_binding)
+        return self.io_binding.get_outputs()[2].numpy()
+
+    def _crop(self, img_rgb: np.ndarray, lmk=None):
         if lmk is not None:
             crop_dct = crop_image(img_rgb, lmk, dsize=self.dsize, scale=1.5, vy_ratio=-0.1)
             img_crop_rgb = crop_dct['img_crop']
@@ -56,18 +76,42 @@ class LandmarkRunner(object):
                     [0., 0., 1.],
                 ], dtype=np.float32),
             }
+        return img_crop_rgb, crop_dct
 
-        inp = (img_crop_rgb.astype(np.float32) / 255.).transpose(2, 0, 1)[None, ...]  # HxWx3 (BGR) -> 1x3xHxW (RGB!)
+    def run(self, img_rgb: np.ndarray, lmk=None):
+        return self.run_batch([img_rgb], [lmk])[0]
 
-        out_lst = self._run(inp)
-        out_pts = out_lst[2]
+    def run_batch(self, img_rgb_lst, lmk_lst=None):
+        """ run the landmark model on N images with a single session call
+        img_rgb_lst: list of HxWx3 images
+        lmk_lst: list of Nx2 landmarks (or None) used to crop each image
+        """
+        if lmk_lst is None:
+            lmk_lst = [None] * len(img_rgb_lst)
+
+        inp = np.empty((len(img_rgb_lst), 3, self.dsize, self.dsize), dtype=np.float32)  # Nx3xHxW (RGB!)
+        crop_dct_lst = []
+        for i, (img_rgb, lmk) in enumerate(zip(img_rgb_lst, lmk_lst)):
+            img_crop_rgb, crop_dct = self._crop(img_rgb, lmk)
+            inp[i] = img_crop_rgb.transpose(2, 0, 1)
+            crop_dct_lst.append(crop_dct)
+        inp /= 255.
+
+        if self.dynamic_batch:
+            out_pts = self._run(inp)
+        else:
+            # the exported graph has a fixed batch dimension, fall back to one call per image
+            out_pts = np.concatenate([self._run(inp[i:i + 1]) for i in range(inp.shape[0])], axis=0)
 
-        pts = to_ndarray(out_pts[0]).reshape(-1, 2) * self.dsize  # scale to 0-224
-        pts = _transform_pts(pts, M=crop_dct['M_c2o'])
+        ret = []
+        for i, crop_dct in enumerate(crop_dct_lst):
+            pts = out_pts[i].reshape(-1, 2) * self.dsize  # scale to 0-224
+            pts = _transform_pts(pts, M=crop_dct['M_c2o'])
+            ret.append({
+                'pts': pts,  # 2d landmarks 203 points
+            })
 
-        return {
-            'pts': pts,  # 2d landmarks 203 points
-        }
+        return ret
 
     def warmup(self):
         self.timer.tic()
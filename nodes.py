@@ -1,5 +1,8 @@
 import os
+import functools
+import warnings
 import torch
+import torch.nn.functional as F
 import yaml
 import folder_paths
 import comfy.model_management as mm
@@ -23,11 +26,73 @@ from .liveportrait.modules.appearance_feature_extractor import (
 from .liveportrait.modules.stitching_retargeting_network import (
     StitchingRetargetingNetwork,
 )
+from .liveportrait.modules.util import fuse_conv_bn
+from .liveportrait.utils.helper import draw_keypoints, make_compile_warmup_inputs
 
 import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _load_model_config(path):
+    with open(path, "r") as file:
+        return yaml.safe_load(file)
+
+@functools.lru_cache(maxsize=1)
+def _default_mask_template():
+    # the template is a grayscale PNG, a single channel is enough since the paste back broadcasts it
+    mask_template = cv2.imread(os.path.join(script_directory, "liveportrait", "utils", "resources", "mask_template.png"), cv2.IMREAD_GRAYSCALE)
+    # shared between calls, so make sure nobody writes into it
+    mask_template.setflags(write=False)
+    return mask_template
+
+def quantize_linear_layers(module):
+    """Dynamically quantize the nn.Linear layers of a CPU module to int8 weights, returns the module unchanged if that is not supported."""
+    try:
+        # quantize_dynamic is deprecated and warns once per call and per layer, the opt-in loader option is warning enough
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+    except (AttributeError, RuntimeError) as e:
+        log.warning(f"int8 quantization not available, keeping fp32 weights: {e}")
+        return module
+
+def image_to_uint8_np(image):
+    """Scale a 0-1 float tensor to uint8 on its own device, so only uint8 bytes are copied to the host."""
+    if image.dtype == torch.uint8:
+        return image.cpu().numpy()
+    return image.mul(255).clamp_(0, 255).to(torch.uint8).cpu().numpy()
+
+def resize_driving_images(images, device, dtype, size=256, chunk_size=64):
+    """Resize NxHxWx3 driving frames to Nx3xsizexsize on the host.
+    On CUDA the frames are resized on the GPU a chunk at a time in the target dtype and collected in a pinned, channels_last
+    host buffer, so only one chunk is resident and the pipeline can upload each frame asynchronously.
+    Elsewhere they are resized with lanczos on the CPU.
+    """
+    if device.type != "cuda":
+        return comfy.utils.common_upscale(images.permute(0, 3, 1, 2), size, size, "lanczos", "disabled").to(dtype)
+
+    # NHWC storage viewed as NCHW is channels_last, so later .contiguous(memory_format=torch.channels_last) keeps the pinned buffer
+    resized = torch.empty((images.shape[0], size, size, 3), dtype=dtype, pin_memory=True).permute(0, 3, 1, 2)
+    for start in range(0, images.shape[0], chunk_size):
+        chunk = images[start:start + chunk_size].to(device=device, dtype=dtype).permute(0, 3, 1, 2)
+        resized[start:start + chunk_size].copy_(F.interpolate(chunk, size=(size, size), mode="bicubic", antialias=True, align_corners=False).clamp_(0, 1))
+    return resized
+
+def stack_frames(frames):
+    """Copy a list of HxWxC frames into one preallocated NxHxWxC array."""
+    out = np.empty((len(frames), *frames[0].shape), dtype=frames[0].dtype)
+    for i, frame in enumerate(frames):
+        out[i] = frame
+    return out
+
+def uint8_frames_to_tensor(frames):
+    """Stack uint8 frames and normalize them to 0-1 with a single float conversion."""
+    if not isinstance(frames, np.ndarray):
+        frames = stack_frames(frames)
+    # from_numpy shares the buffer, the float conversion is the only copy
+    return torch.from_numpy(frames).to(torch.float32).div_(255.0)
+
 class InferenceConfig:
     def __init__(
         self,
@@ -73,6 +138,8 @@ class DownloadAndLoadLivePortraitModels:
                     ],
                     {"default": "auto"},
                 ),
+                "torch_compile": ("BOOLEAN", {"default": False}),
+                "quantize_stitching": ("BOOLEAN", {"default": False}),
             },
         }
 
@@ -81,7 +148,7 @@ class DownloadAndLoadLivePortraitModels:
     FUNCTION = "loadmodel"
     CATEGORY = "LivePortrait"
 
-    def loadmodel(self, precision="fp16"):
+    def loadmodel(self, precision="fp16", torch_compile=False, quantize_stitching=False):
         device = mm.get_torch_device()
         mm.soft_empty_cache()
 
@@ -120,18 +187,19 @@ class DownloadAndLoadLivePortraitModels:
         model_config_path = os.path.join(
             script_directory, "liveportrait", "config", "models.yaml"
         )
-        with open(model_config_path, "r") as file:
-            model_config = yaml.safe_load(file)
-
-        feature_extractor_path = os.path.join(
-            model_path, "appearance_feature_extractor.safetensors"
-        )
-        motion_extractor_path = os.path.join(model_path, "motion_extractor.safetensors")
-        warping_module_path = os.path.join(model_path, "warping_module.safetensors")
-        spade_generator_path = os.path.join(model_path, "spade_generator.safetensors")
-        stitching_retargeting_path = os.path.join(
-            model_path, "stitching_retargeting_module.safetensors"
-        )
+        model_config = _load_model_config(model_config_path)
+
+        # checkpoints are read straight onto the target device, so the weights are never materialized in host RAM
+        model_files = {
+            name: os.path.join(model_path, f"{name}.safetensors")
+            for name in (
+                "appearance_feature_extractor",
+                "motion_extractor",
+                "warping_module",
+                "spade_generator",
+                "stitching_retargeting_module",
+            )
+        }
 
         # init F
         model_params = model_config["model_params"][
@@ -141,16 +209,17 @@ class DownloadAndLoadLivePortraitModels:
             **model_params
         ).to(device)
         self.appearance_feature_extractor.load_state_dict(
-            comfy.utils.load_torch_file(feature_extractor_path)
+            comfy.utils.load_torch_file(model_files["appearance_feature_extractor"], device=device)
         )
         self.appearance_feature_extractor.eval()
+        fuse_conv_bn(self.appearance_feature_extractor)
         log.info("Load appearance_feature_extractor done.")
         pbar.update(1)
         # init M
         model_params = model_config["model_params"]["motion_extractor_params"]
         self.motion_extractor = MotionExtractor(**model_params).to(device)
         self.motion_extractor.load_state_dict(
-            comfy.utils.load_torch_file(motion_extractor_path)
+            comfy.utils.load_torch_file(model_files["motion_extractor"], device=device)
         )
         self.motion_extractor.eval()
         log.info("Load motion_extractor done.")
@@ -159,54 +228,63 @@ class DownloadAndLoadLivePortraitModels:
         model_params = model_config["model_params"]["warping_module_params"]
         self.warping_module = WarpingNetwork(**model_params).to(device)
         self.warping_module.load_state_dict(
-            comfy.utils.load_torch_file(warping_module_path)
+            comfy.utils.load_torch_file(model_files["warping_module"], device=device)
         )
         self.warping_module.eval()
+        fuse_conv_bn(self.warping_module)
         log.info("Load warping_module done.")
         pbar.update(1)
         # init G
         model_params = model_config["model_params"]["spade_generator_params"]
         self.spade_generator = SPADEDecoder(**model_params).to(device)
         self.spade_generator.load_state_dict(
-            comfy.utils.load_torch_file(spade_generator_path)
+            comfy.utils.load_torch_file(model_files["spade_generator"], device=device)
         )
         self.spade_generator.eval()
+        # only G is purely 2D, F and W have Conv3d weights that channels_last can not hold
+        if device.type == "cuda":
+            self.spade_generator.to(memory_format=torch.channels_last)
         log.info("Load spade_generator done.")
         pbar.update(1)
 
         def filter_checkpoint_for_model(checkpoint, prefix):
             """Filter and adjust the checkpoint dictionary for a specific model based on the prefix."""
             # Create a new dictionary where keys are adjusted by removing the prefix and the model name
+            key_prefix = prefix + "_module."
+            prefix_length = len(key_prefix)
             filtered_checkpoint = {
-                key.replace(prefix + "_module.", ""): value
+                key[prefix_length:]: value
                 for key, value in checkpoint.items()
-                if key.startswith(prefix)
+                if key.startswith(key_prefix)
             }
             return filtered_checkpoint
 
         config = model_config["model_params"]["stitching_retargeting_module_params"]
-        checkpoint = comfy.utils.load_torch_file(stitching_retargeting_path)
+        checkpoint = comfy.utils.load_torch_file(model_files["stitching_retargeting_module"], device=device)
 
         stitcher_prefix = "retarget_shoulder"
         stitcher_checkpoint = filter_checkpoint_for_model(checkpoint, stitcher_prefix)
-        stitcher = StitchingRetargetingNetwork(**config.get("stitching"))
+        stitcher = StitchingRetargetingNetwork(**config.get("stitching")).to(device)
         stitcher.load_state_dict(stitcher_checkpoint)
-        stitcher = stitcher.to(device)
         stitcher.eval()
 
         lip_prefix = "retarget_mouth"
         lip_checkpoint = filter_checkpoint_for_model(checkpoint, lip_prefix)
-        retargetor_lip = StitchingRetargetingNetwork(**config.get("lip"))
+        retargetor_lip = StitchingRetargetingNetwork(**config.get("lip")).to(device)
         retargetor_lip.load_state_dict(lip_checkpoint)
-        retargetor_lip = retargetor_lip.to(device)
         retargetor_lip.eval()
 
         eye_prefix = "retarget_eye"
         eye_checkpoint = filter_checkpoint_for_model(checkpoint, eye_prefix)
-        retargetor_eye = StitchingRetargetingNetwork(**config.get("eye"))
+        retargetor_eye = StitchingRetargetingNetwork(**config.get("eye")).to(device)
         retargetor_eye.load_state_dict(eye_checkpoint)
-        retargetor_eye = retargetor_eye.to(device)
         retargetor_eye.eval()
+        # the stitching and retargeting MLPs run once per frame, on CPU int8 weights make them cheaper
+        # opt-in: outputs drift by about 1e-3 from fp32, and on GPU the MLPs are launch bound anyway
+        if quantize_stitching and device.type == "cpu":
+            stitcher = quantize_linear_layers(stitcher)
+            retargetor_lip = quantize_linear_layers(retargetor_lip)
+            retargetor_eye = quantize_linear_layers(retargetor_eye)
         log.info("Load stitching_retargeting_module done.")
 
         self.stich_retargeting_module = {
@@ -227,6 +305,32 @@ class DownloadAndLoadLivePortraitModels:
             ),
         )
 
+        if torch_compile:
+            compiled_modules = (
+                self.appearance_feature_extractor,
+                self.motion_extractor,
+                self.warping_module,
+                self.spade_generator,
+            )
+            for module in compiled_modules:
+                module.forward = torch.compile(module.forward, dynamic=False)
+            # warm up through the same wrapper calls the pipeline uses, so compilation happens here and not on the first frame
+            try:
+                log.info("Compiling LivePortrait models...")
+                wrapper = pipeline.live_portrait_wrapper
+                driving_dtype = torch.float16 if wrapper.cfg.flag_use_half_precision else torch.float32
+                dummy_image, dummy_driving_image = make_compile_warmup_inputs(device, driving_dtype)
+                with torch.inference_mode():
+                    wrapper.get_kp_info(dummy_driving_image)
+                    kp_info = wrapper.get_kp_info(dummy_image)
+                    feature_3d = wrapper.extract_feature_3d(dummy_image)
+                    kp = wrapper.transform_keypoint(kp_info)
+                    wrapper.warp_decode(feature_3d, kp, kp)
+            except Exception as e:
+                log.warning(f"torch.compile failed, using eager models: {e}")
+                for module in compiled_modules:
+                    del module.forward
+
         return (pipeline,)
 
 
@@ -294,7 +398,7 @@ class LivePortraitProcess:
     ):
         if driving_images.shape[0] < source_image.shape[0]:
             raise ValueError("The number of driving images should be larger than the number of source images.")
-        source_np = (source_image * 255).byte().numpy()
+        source_np = image_to_uint8_np(source_image)
         
         pipeline.live_portrait_wrapper.cfg.flag_eye_retargeting = eye_retargeting
         pipeline.live_portrait_wrapper.cfg.eyes_retargeting_multiplier = (
@@ -313,45 +417,39 @@ class LivePortraitProcess:
             log.warning("Warning: lip_zero only has an effect with lip or eye retargeting")
 
         if mask is not None:
-            crop_mask = mask[0].cpu().numpy()
-            crop_mask = (crop_mask * 255).astype(np.uint8)
-            crop_mask = np.repeat(np.atleast_3d(crop_mask), 3, axis=2)
+            crop_mask = image_to_uint8_np(mask[0])
             pipeline.live_portrait_wrapper.cfg.mask_crop = crop_mask
         else:
             log.info("Using default mask template")
-            pipeline.live_portrait_wrapper.cfg.mask_crop = cv2.imread(os.path.join(script_directory, "liveportrait", "utils", "resources", "mask_template.png"), cv2.IMREAD_COLOR)
-
-        driving_images_256 = comfy.utils.common_upscale(driving_images.permute(0, 3, 1, 2), 256, 256, "lanczos", "disabled")
-        if pipeline.live_portrait_wrapper.cfg.flag_use_half_precision:
-            driving_images_256 = driving_images_256.to(torch.float16)
-
-        cropped_out_list = []
-        full_out_list = []
+            pipeline.live_portrait_wrapper.cfg.mask_crop = _default_mask_template()
 
-        cropped_out_list, full_out_list, out_mask_list = pipeline.execute(
-            source_np, 
-            driving_images_256, 
-            crop_info, 
-            mismatch_method
+        driving_images_256 = resize_driving_images(
+            driving_images,
+            pipeline.live_portrait_wrapper.cfg.device_id,
+            torch.float16 if pipeline.live_portrait_wrapper.cfg.flag_use_half_precision else torch.float32,
         )
+        driving_images_256 = driving_images_256.contiguous(memory_format=torch.channels_last)
+
+        with torch.inference_mode():
+            cropped_out, out_full, out_mask = pipeline.execute(
+                source_np, 
+                driving_images_256, 
+                crop_info, 
+                mismatch_method
+            )
       
-        cropped_out_tensors = torch.cat(cropped_out_list, dim=0)
-        cropped_out_tensors = cropped_out_tensors
-        
-        full_tensors_out = (
-            torch.stack([torch.from_numpy(np_array) for np_array in full_out_list])
-            / 255
-        )
+        # single copy and cast to the float32 host tensor ComfyUI expects
+        cropped_out_tensors = cropped_out.to(device="cpu", dtype=torch.float32)
         
-        mask_tensors_out = (
-            torch.stack([torch.from_numpy(np_array) for np_array in out_mask_list])
-        )[:, :, :, 0]
+        full_tensors_out = uint8_frames_to_tensor(out_full)
+
+        mask_tensors_out = torch.from_numpy(out_mask)
         
         
         return (
-            cropped_out_tensors.cpu().float(), 
-            full_tensors_out.cpu().float(), 
-            mask_tensors_out.cpu().float()
+            cropped_out_tensors, 
+            full_tensors_out, 
+            mask_tensors_out
             )
 
 
@@ -371,7 +469,8 @@ class LivePortraitCropper:
                     ['CPU', 'CUDA', 'ROCM'], {
                         "default": 'CPU'
                     }),
-            "keep_model_loaded": ("BOOLEAN", {"default": True})
+            "keep_model_loaded": ("BOOLEAN", {"default": True}),
+            "batch_size": ("INT", {"default": 16, "min": 1, "max": 256}),
             },
             "optional": {
                 "opt_driving_images": ("IMAGE",),
@@ -384,47 +483,48 @@ class LivePortraitCropper:
     FUNCTION = "process"
     CATEGORY = "LivePortrait"
 
-    def process(self, source_image, dsize, scale, vx_ratio, vy_ratio, face_index, rotate, keep_model_loaded, onnx_device='CUDA', opt_driving_images=None):
-        source_image_np = (source_image * 255).byte().numpy()
+    def process(self, source_image, dsize, scale, vx_ratio, vy_ratio, face_index, rotate, keep_model_loaded, onnx_device='CUDA', batch_size=16, opt_driving_images=None):
+        source_image_np = image_to_uint8_np(source_image)
 
         cropper_init_config = {
-            'keep_model_loaded': keep_model_loaded,
-            'onnx_device': onnx_device
+            'onnx_device': onnx_device,
+            # on CPU the per-frame detection is spread over a thread pool
+            'num_workers': min(8, os.cpu_count() or 1) if onnx_device == 'CPU' else 1,
         }
+        # keep_model_loaded does not change how the cropper is built, so toggling it must not rebuild the ONNX sessions
+        cropper_key = frozenset(cropper_init_config.items())
         
-        if not hasattr(self, 'cropper') or self.cropper is None or self.current_config != cropper_init_config:
-            self.current_config = cropper_init_config
+        if not hasattr(self, 'cropper') or self.cropper is None or self.current_config != cropper_key:
+            self.current_config = cropper_key
+            # the Cropper warms up its ONNX sessions on construction, so the first frame does not pay for it
             self.cropper = Cropper(**cropper_init_config)
 
         crop_info_list = []
         cropped_images_list = []
 
         if opt_driving_images is not None:
-            driving_images_np = (opt_driving_images * 255).byte().numpy()
+            driving_images_np = image_to_uint8_np(opt_driving_images)
             driving_landmark_list = []
        
         pbar = comfy.utils.ProgressBar(len(source_image_np))
-        for i in tqdm(range(len(source_image_np)), desc='Detecting and cropping..', total=len(source_image_np)):
-            crop_info = self.cropper.crop_single_image(source_image_np[i], dsize, scale, vy_ratio, vx_ratio, face_index, rotate)
-            crop_info_list.append(crop_info)
-            cropped_image = crop_info['img_crop_256x256']
-            cropped_images_list.append(cropped_image)
+        for start in tqdm(range(0, len(source_image_np), batch_size), desc='Detecting and cropping..'):
+            end = min(start + batch_size, len(source_image_np))
+            crop_info_batch = self.cropper.crop_batch(source_image_np[start:end], dsize, scale, vy_ratio, vx_ratio, face_index, rotate)
+            crop_info_list.extend(crop_info_batch)
+            cropped_images_list.extend(crop_info['img_crop_256x256'] for crop_info in crop_info_batch)
 
             if opt_driving_images is not None:
-                driving_crop_dict = self.cropper.crop_single_image(driving_images_np[i], dsize, scale, vy_ratio, vx_ratio, face_index, rotate)
-                driving_landmark_list.append(driving_crop_dict['lmk_crop'])
-              
-            pbar.update(1)
+                driving_crop_batch = self.cropper.crop_batch(driving_images_np[start:end], dsize, scale, vy_ratio, vx_ratio, face_index, rotate)
+                driving_landmark_list.extend(driving_crop_dict['lmk_crop'] for driving_crop_dict in driving_crop_batch)
+
+            pbar.update(end - start)
         
         if not keep_model_loaded:
             self.cropper = None
             mm.soft_empty_cache()
 
         
-        cropped_tensors_out = (
-            torch.stack([torch.from_numpy(np_array) for np_array in cropped_images_list])
-            / 255
-        )
+        cropped_tensors_out = uint8_frames_to_tensor(cropped_images_list)
 
         crop_info_dict = {
             'crop_info_list': crop_info_list
@@ -451,23 +551,11 @@ class KeypointsToImage:
 
     def drawkeypoints(self, crop_info):
         height, width = crop_info["crop_info_list"][0]['input_image_size']
-        keypoints_img_list = []
-        pbar = comfy.utils.ProgressBar(len(crop_info))
-        for crop in crop_info["crop_info_list"]:
-            keypoints = crop['lmk_crop'].copy()
-            # Draw each landmark as a circle
-            blank_image = np.zeros((height, width, 3), dtype=np.uint8) * 255
-            for (x, y) in keypoints:
-                # Ensure the coordinates are within the dimensions of the blank image
-                if 0 <= x < width and 0 <= y < height:
-                    cv2.circle(blank_image, (int(x), int(y)), radius=2, color=(0, 0, 255))
-
-            keypoints_image = cv2.cvtColor(blank_image, cv2.COLOR_BGR2RGB)
-            keypoints_img_list.append(keypoints_image)
-            pbar.update(1)
+        keypoints_list = [crop['lmk_crop'] for crop in crop_info["crop_info_list"]]
+        # Draw each landmark as a circle
+        keypoints_images = draw_keypoints(keypoints_list, height, width)
 
-        keypoints_img_tensor = (
-            torch.stack([torch.from_numpy(np_array) for np_array in keypoints_img_list]) / 255).float()
+        keypoints_img_tensor = uint8_frames_to_tensor(keypoints_images)
 
 
         return (keypoints_img_tensor,)
@@ -491,34 +579,18 @@ class KeypointScaler:
 
     def process(self, crop_info, offset_x, offset_y, scale):
 
-        keypoints = crop_info['crop_info']['lmk_crop'].copy()
+        keypoints = crop_info['crop_info']['lmk_crop']
 
-        # Create an offset array
-        # Calculate the centroid of the keypoints
+        # Scale the keypoints around their centroid, then apply the offset
         centroid = keypoints.mean(axis=0)
-
-        # Translate keypoints to origin by subtracting the centroid
-        translated_keypoints = keypoints - centroid
-
-        # Scale the translated keypoints
-        scaled_keypoints = translated_keypoints * scale
-
-        # Translate scaled keypoints back to original position and then apply the offset
-        final_keypoints = scaled_keypoints + centroid + np.array([offset_x, offset_y])
+        final_keypoints = (keypoints - centroid) * scale + centroid + np.array([offset_x, offset_y])
 
         crop_info['crop_info']['lmk_crop'] = final_keypoints #fix this
 
         # Draw each landmark as a circle
         width, height = 512, 512
-        blank_image = np.zeros((height, width, 3), dtype=np.uint8) * 255
-        for (x, y) in final_keypoints:
-            # Ensure the coordinates are within the dimensions of the blank image
-            if 0 <= x < width and 0 <= y < height:
-                cv2.circle(blank_image, (int(x), int(y)), radius=2, color=(0, 0, 255))
-
-        keypoints_image = cv2.cvtColor(blank_image, cv2.COLOR_BGR2RGB)
-        keypoints_image_tensor = torch.from_numpy(keypoints_image) / 255
-        keypoints_image_tensor = keypoints_image_tensor.unsqueeze(0).cpu().float()
+        keypoints_image = draw_keypoints([final_keypoints], height, width)
+        keypoints_image_tensor = uint8_frames_to_tensor(keypoints_image)
         
         return (crop_info, keypoints_image_tensor,)
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the liveportrait package importable without a ComfyUI checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
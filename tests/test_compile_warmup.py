@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from liveportrait.utils.helper import make_compile_warmup_inputs
+
+
+@pytest.mark.parametrize("driving_dtype", [torch.float32, torch.float16])
+def test_warmup_leaves_no_recompiles(driving_dtype):
+    from torch._dynamo.utils import counters
+
+    torch._dynamo.reset()
+    conv = torch.nn.Conv2d(3, 4, 3)
+    model = torch.compile(lambda x: conv(x.float()), dynamic=False, backend="eager")
+
+    source, driving = make_compile_warmup_inputs(torch.device("cpu"), driving_dtype)
+    with torch.inference_mode():
+        model(driving)
+        model(source)
+    graphs = counters["stats"]["unique_graphs"]
+
+    # source as built by LivePortraitWrapper.prepare_source
+    real_source = torch.from_numpy(np.zeros((1, 256, 256, 3), dtype=np.float32)).permute(0, 3, 1, 2)
+    # driving frames as resized in LivePortraitProcess and sliced in LivePortraitPipeline.execute
+    driving_images = torch.empty((4, 256, 256, 3), dtype=driving_dtype).permute(0, 3, 1, 2)
+    driving_images = driving_images.contiguous(memory_format=torch.channels_last)
+    with torch.inference_mode():
+        model(real_source)
+        for i in range(driving_images.shape[0]):
+            model(driving_images[i].unsqueeze(0))
+    assert counters["stats"]["unique_graphs"] == graphs
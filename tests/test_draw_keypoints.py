@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from liveportrait.utils.helper import draw_keypoints
+
+
+def draw_keypoints_cv2(keypoints, height, width):
+    blank_image = np.zeros((height, width, 3), dtype=np.uint8)
+    for (x, y) in keypoints:
+        if 0 <= x < width and 0 <= y < height:
+            cv2.circle(blank_image, (int(x), int(y)), radius=2, color=(0, 0, 255))
+    return cv2.cvtColor(blank_image, cv2.COLOR_BGR2RGB)
+
+
+def test_matches_cv2_circle():
+    rng = np.random.default_rng(0)
+    height, width = 64, 48
+    keypoints_list = [
+        rng.uniform(-4, 68, size=(203, 2)).astype(np.float32),
+        # points on and just off the image borders
+        np.array([[0, 0], [width - 1, height - 1], [0.9, 63.5], [47.99, 1.2], [-0.5, 10], [48, 10], [10, 64]], dtype=np.float32),
+        np.zeros((0, 2), dtype=np.float32),
+    ]
+    images = draw_keypoints(keypoints_list, height, width)
+    assert images.shape == (len(keypoints_list), height, width, 3)
+    for image, keypoints in zip(images, keypoints_list):
+        np.testing.assert_array_equal(image, draw_keypoints_cv2(keypoints, height, width))
+
+
+def test_scaled_keypoints_match_cv2_circle():
+    # KeypointScaler draws its preview on a 512x512 canvas from float64 keypoints
+    rng = np.random.default_rng(1)
+    keypoints = rng.uniform(0, 512, size=(203, 2)).astype(np.float32)
+    for scale, offset_x, offset_y in [(1.0, 0, 0), (0.8, 3, -5), (1.7, -40, 25)]:
+        centroid = keypoints.mean(axis=0)
+        final_keypoints = (keypoints - centroid) * scale + centroid + np.array([offset_x, offset_y])
+        image = draw_keypoints([final_keypoints], 512, 512)[0]
+        np.testing.assert_array_equal(image, draw_keypoints_cv2(final_keypoints, 512, 512))
+
+
+def test_empty_list():
+    assert draw_keypoints([], 8, 8).shape == (0, 8, 8, 3)
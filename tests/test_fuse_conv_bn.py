@@ -0,0 +1,58 @@
+import copy
+
+import pytest
+
+torch = pytest.importorskip("torch")
+from torch import nn
+
+from liveportrait.modules.appearance_feature_extractor import AppearanceFeatureExtractor
+from liveportrait.modules.util import fuse_conv_bn
+from liveportrait.modules.warping_network import WarpingNetwork
+
+
+def randomize_batch_norms(model):
+    for module in model.modules():
+        if isinstance(module, (nn.BatchNorm2d, nn.BatchNorm3d)):
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.5, 0.5)
+    return model.eval()
+
+
+def count_batch_norms(model):
+    return sum(isinstance(m, (nn.BatchNorm2d, nn.BatchNorm3d)) for m in model.modules())
+
+
+def fused_copy(model):
+    # pre-activation blocks like ResBlock3d normalize before the conv and keep their norms
+    fused = fuse_conv_bn(copy.deepcopy(model))
+    assert count_batch_norms(fused) < count_batch_norms(model)
+    return fused
+
+
+@torch.inference_mode()
+def test_fuse_appearance_feature_extractor():
+    torch.manual_seed(0)
+    model = randomize_batch_norms(AppearanceFeatureExtractor(
+        image_channel=3, block_expansion=8, num_down_blocks=2, max_features=64,
+        reshape_channel=4, reshape_depth=16, num_resblocks=1,
+    ))
+    x = torch.rand(1, 3, 64, 64)
+    torch.testing.assert_close(fused_copy(model)(x), model(x), rtol=1e-4, atol=1e-5)
+
+
+@torch.inference_mode()
+def test_fuse_warping_network():
+    torch.manual_seed(0)
+    model = randomize_batch_norms(WarpingNetwork(
+        num_kp=3, block_expansion=8, max_features=64, num_down_blocks=2, reshape_channel=4, estimate_occlusion_map=True,
+        dense_motion_params=dict(block_expansion=8, max_features=32, num_blocks=2, reshape_depth=16, compress=2),
+    ))
+    feature_3d = torch.randn(1, 4, 16, 16, 16)
+    kp_source = torch.rand(1, 3, 3) * 2 - 1
+    kp_driving = torch.rand(1, 3, 3) * 2 - 1
+    expected = model(feature_3d, kp_driving=kp_driving, kp_source=kp_source)
+    out = fused_copy(model)(feature_3d, kp_driving=kp_driving, kp_source=kp_source)
+    for key in ("out", "occlusion_map", "deformation"):
+        torch.testing.assert_close(out[key], expected[key], rtol=1e-4, atol=1e-5)